@@ -1,16 +1,47 @@
 import os
 import sys
-import json
+import io
+import mmap
+import stat
 import hashlib
-import shutil
-import difflib
-from datetime import datetime
+from functools import cached_property, lru_cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from blake3 import blake3 as _hasher
+except ImportError:
+    _hasher = hashlib.sha1
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 MINIGIT_DIR = ".minigit"
 COMMITS_DIR = os.path.join(MINIGIT_DIR, "commits")
+OBJECTS_DIR = os.path.join(MINIGIT_DIR, "objects")
 INDEX_FILE = os.path.join(MINIGIT_DIR, "index.json")
 PRS_FILE = os.path.join(MINIGIT_DIR, "prs.json")
 BRANCHES_DIR = os.path.join(MINIGIT_DIR, "branches")
+HASHCACHE_FILE = os.path.join(MINIGIT_DIR, "hashcache.json")
+FICLONE = 0x40049409
+MMAP_THRESHOLD = 1 << 20
+COMPRESSED_SUFFIX = ".zst"
+PRECOMPRESSED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".zip", ".gz", ".bz2", ".xz", ".zst", ".7z", ".mp3", ".mp4"}
+
+# Fresh hash objects are copied from this instead of being constructed per file
+_HASH_TEMPLATE = _hasher()
+HASH_NAME = _HASH_TEMPLATE.name
+HASH_HEX_LEN = _HASH_TEMPLATE.digest_size * 2
 
 
 def ensure_repo():
@@ -19,14 +50,381 @@ def ensure_repo():
         sys.exit(1)
 
 
+def _read_json(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if orjson:
+        return orjson.loads(data)
+    import json
+    return json.loads(data)
+
+
+def _write_json(path, data, indent=False, exclusive=False):
+    if orjson:
+        raw = orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    else:
+        import json
+        raw = json.dumps(data, indent=2 if indent else None).encode()
+    with open(path, "xb" if exclusive else "wb") as f:
+        f.write(raw)
+
+
+def _hash_file(path):
+    with open(path, "rb") as f:
+        # Large files are hashed straight from the page cache, without copying
+        if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+            h = _HASH_TEMPLATE.copy()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+            return h.hexdigest()
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, _HASH_TEMPLATE.copy).hexdigest()
+        # Python < 3.11: hash through a reusable 1 MiB buffer
+        h = _HASH_TEMPLATE.copy()
+        buf = bytearray(1 << 20)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+        return h.hexdigest()
+
+
+def _kernel_copy(src_fd, dst_fd, size):
+    # copy_file_range can share extents on some filesystems; sendfile works on
+    # any Linux. Each attempt starts over from offset 0.
+    for name in ("copy_file_range", "sendfile"):
+        if not hasattr(os, name):
+            continue
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        os.ftruncate(dst_fd, 0)
+        copied = 0
+        try:
+            while copied < size:
+                if name == "copy_file_range":
+                    n = os.copy_file_range(src_fd, dst_fd, size - copied)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, None, size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return True
+        except OSError:
+            continue
+    return False
+
+
+def _fast_copy(src, dst):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        # Reflink on filesystems that support it (btrfs, XFS): no data is copied
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                return
+            except OSError:
+                pass
+        if _kernel_copy(src_fd, dst_fd, os.fstat(src_fd).st_size):
+            return
+        import shutil
+        fsrc.seek(0)
+        fdst.seek(0)
+        fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst)
+
+
+def _run_parallel(func, items):
+    # Copying and hashing release the GIL, so threads overlap the work
+    if len(items) < 2:
+        return [func(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def _restore_file(src, dst, mode):
+    _copy_committed_file(src, dst)
+    if mode is not None:
+        os.chmod(dst, mode)
+
+
+def _batch_copy_files(restores):
+    # Submit all copies at once so the kernel has several in flight
+    _run_parallel(lambda restore: _restore_file(*restore), restores)
+
+
+def _load_hashcache():
+    # The cache is only an optimisation, so anything unusable is discarded
+    try:
+        cache = _read_json(HASHCACHE_FILE)
+    except (OSError, ValueError):
+        cache = None
+    # Digests from another hash algorithm can't be compared with ours
+    if (isinstance(cache, dict) and cache.get("algorithm") == HASH_NAME
+            and isinstance(cache.get("worktree"), dict) and isinstance(cache.get("commits"), dict)):
+        return cache
+    return {"algorithm": HASH_NAME, "worktree": {}, "commits": {}}
+
+
+def _save_hashcache(cache):
+    tmp_file = HASHCACHE_FILE + ".tmp"
+    _write_json(tmp_file, cache)
+    os.replace(tmp_file, HASHCACHE_FILE)
+
+
+def _hash_working_file(path, cache, st=None):
+    # Working-tree entries are valid as long as mtime and size are unchanged
+    if st is None:
+        st = os.stat(path)
+    cached = cache["worktree"].get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    digest = _hash_file(path)
+    cache["worktree"][path] = [st.st_mtime_ns, st.st_size, digest]
+    return digest
+
+
+def _hash_committed_file(commit, filename, cache):
+    # Blob names are digests, usable directly when made with the same algorithm
+    if isinstance(commit["files"], dict) and len(commit["files"][filename]) == HASH_HEX_LEN:
+        return commit["files"][filename]
+    # Committed files never change, so a cached digest is always valid
+    key = f"{commit['id']}/{filename}"
+    digest = cache["commits"].get(key)
+    if digest is None:
+        digest = _hash_committed_path(_commit_file_path(commit, filename))
+        cache["commits"][key] = digest
+    return digest
+
+
+def _blob_path(digest):
+    return os.path.join(OBJECTS_DIR, digest[:2], digest[2:])
+
+
+def _is_compressed_blob(path):
+    # Blob names are hex digests, so only zstd blobs carry the suffix
+    return path.startswith(OBJECTS_DIR + os.sep) and path.endswith(COMPRESSED_SUFFIX)
+
+
+def _require_zstandard():
+    if zstandard is None:
+        print("This repo has compressed objects. Install `zstandard` to read them.")
+        sys.exit(1)
+
+
+def _store_blob(path, hashcache=None, st=None):
+    import threading
+    # Working-tree files go through the hash cache; committed copies don't
+    if hashcache is not None:
+        digest = _hash_working_file(path, hashcache, st)
+    else:
+        digest = _hash_file(path)
+    blob_path = _blob_path(digest)
+    if os.path.exists(blob_path) or os.path.exists(blob_path + COMPRESSED_SUFFIX):
+        return digest
+
+    # Copy rather than hardlink so later edits to the working file
+    # can't change the stored blob
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    # Blobs are stored in parallel, and identical files must not share a temp file
+    tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    if zstandard is not None and os.path.splitext(path)[1].lower() not in PRECOMPRESSED_EXTENSIONS:
+        blob_path += COMPRESSED_SUFFIX
+        tmp_path = blob_path + tmp_suffix
+        with open(path, "rb") as fsrc, open(tmp_path, "wb") as fdst:
+            # Passing the size records it in the frame header for _committed_size()
+            size = os.fstat(fsrc.fileno()).st_size
+            zstandard.ZstdCompressor(level=3).copy_stream(fsrc, fdst, size=size)
+    else:
+        tmp_path = blob_path + tmp_suffix
+        _fast_copy(path, tmp_path)
+    os.replace(tmp_path, blob_path)
+    return digest
+
+
+def _commit_file_path(commit, filename):
+    # Older commits store a full copy of each file under their commit directory
+    if isinstance(commit["files"], dict):
+        blob_path = _blob_path(commit["files"][filename])
+        compressed_path = blob_path + COMPRESSED_SUFFIX
+        return compressed_path if os.path.exists(compressed_path) else blob_path
+    return os.path.join(COMMITS_DIR, commit["id"], filename)
+
+
+def _commit_file_mode(commit, filename):
+    # Permission bits recorded at commit time, or None if the commit has none
+    if "modes" in commit:
+        return commit["modes"].get(filename)
+    # Older commits keep per-file copies that carry the mode themselves
+    if not isinstance(commit["files"], dict):
+        path = os.path.join(COMMITS_DIR, commit["id"], filename)
+        if os.path.exists(path):
+            return stat.S_IMODE(os.stat(path).st_mode)
+    return None
+
+
+def _open_committed_file(path):
+    if not _is_compressed_blob(path):
+        return open(path, "rb")
+    _require_zstandard()
+    # Decompressor objects aren't thread-safe, so each reader gets its own
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+
+def _read_committed_lines(path):
+    with io.TextIOWrapper(_open_committed_file(path)) as f:
+        return f.readlines()
+
+
+def _committed_size(path):
+    if not _is_compressed_blob(path):
+        return os.path.getsize(path)
+    _require_zstandard()
+    with open(path, "rb") as f:
+        return zstandard.frame_content_size(f.read(18))
+
+
+def _hash_committed_path(path):
+    if not _is_compressed_blob(path):
+        return _hash_file(path)
+    h = _HASH_TEMPLATE.copy()
+    with _open_committed_file(path) as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _copy_committed_file(src, dst):
+    if not _is_compressed_blob(src):
+        _fast_copy(src, dst)
+        return
+    import shutil
+    with _open_committed_file(src) as fsrc, open(dst, "wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+def _commit_meta_path(commit_id):
+    return os.path.join(COMMITS_DIR, f"{commit_id}.json")
+
+
+@lru_cache(maxsize=None)
+def _load_commit(commit_id):
+    return _read_json(_commit_meta_path(commit_id))
+
+
+def _save_commit(commit_data):
+    # Never overwrite an existing commit; returns False if the id is taken
+    try:
+        _write_json(_commit_meta_path(commit_data["id"]), commit_data, indent=True, exclusive=True)
+    except FileExistsError:
+        return False
+    return True
+
+
+def _create_commit(message, files, modes):
+    import uuid
+    from datetime import datetime
+    # Short ids can collide, so draw a new one until the metadata file is ours
+    while True:
+        commit_data = {
+            "id": uuid.uuid4().hex[:7],
+            "message": message,
+            "timestamp": datetime.now().isoformat(),
+            "files": files,
+            "modes": modes
+        }
+        if _save_commit(commit_data):
+            return commit_data
+
+
+def _migrate_commit_metadata(index):
+    # Older indexes embed full commit dicts in each branch; move them out
+    for commits in index["branches"].values():
+        for i, commit in enumerate(commits):
+            if isinstance(commit, dict):
+                _save_commit(commit)
+                commits[i] = commit["id"]
+
+
+def _commit_positions(index):
+    # Maps each commit id to its position in every branch that contains it
+    positions = {}
+    for branch, commits in index["branches"].items():
+        for i, commit_id in enumerate(commits):
+            positions.setdefault(commit_id, {})[branch] = i
+    return positions
+
+
 def load_index():
-    with open(INDEX_FILE, "r") as f:
-        return json.load(f)
+    index = _read_json(INDEX_FILE)
+    _migrate_commit_metadata(index)
+    return index
 
 
 def save_index(index):
-    with open(INDEX_FILE, "w") as f:
-        json.dump(index, f, indent=2)
+    # Write to a temporary file first so a crash can't leave a torn index
+    tmp_file = INDEX_FILE + ".tmp"
+    _write_json(tmp_file, index, indent=True)
+    os.replace(tmp_file, INDEX_FILE)
+
+
+# Loads the index once per command and saves it once if the command succeeds
+class Repo:
+    def __enter__(self):
+        self.index = load_index()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            save_index(self.index)
+
+    # Built on first use; look positions up before changing any branch
+    @cached_property
+    def commit_positions(self):
+        return _commit_positions(self.index)
+
+
+def _scan_worktree(index, last_commit, hashcache):
+    # Returns (modified, new) working-tree files that aren't staged yet, plus
+    # their DirEntry objects so callers can reuse the cached stat results
+    staged = set(index["staged"])
+    last_commit_files = set(last_commit["files"]) if last_commit else set()
+    modified_files = []
+    new_files = []
+    entries = {}
+    to_hash = []
+    with os.scandir(".") as it:
+        for entry in it:
+            file = entry.name
+            if file == MINIGIT_DIR or file.startswith("."):
+                continue
+            if not entry.is_file() or file in staged:
+                continue
+            entries[file] = entry
+            if file in last_commit_files:
+                # Check if modified
+                last_commit_path = _commit_file_path(last_commit, file)
+                if os.path.exists(last_commit_path):
+                    # A size mismatch means the file changed, no need to hash it
+                    entry_stat = entry.stat()
+                    if entry_stat.st_size != _committed_size(last_commit_path):
+                        modified_files.append(file)
+                    else:
+                        to_hash.append((file, entry_stat))
+            else:
+                # New file not in last commit
+                new_files.append(file)
+
+    def is_modified(item):
+        file, entry_stat = item
+        return _hash_working_file(file, hashcache, entry_stat) != _hash_committed_file(last_commit, file, hashcache)
+
+    for (file, _), modified in zip(to_hash, _run_parallel(is_modified, to_hash)):
+        if modified:
+            modified_files.append(file)
+    return modified_files, new_files, entries
 
 
 def init():
@@ -35,11 +433,10 @@ def init():
         return
 
     os.makedirs(COMMITS_DIR)
+    os.makedirs(OBJECTS_DIR)
     os.makedirs(BRANCHES_DIR)
-    with open(INDEX_FILE, "w") as f:
-        json.dump({"staged": [], "branches": {"main": []}, "current_branch": "main"}, f)
-    with open(PRS_FILE, "w") as f:
-        json.dump([], f)
+    _write_json(INDEX_FILE, {"staged": [], "branches": {"main": []}, "current_branch": "main"})
+    _write_json(PRS_FILE, [])
 
     print("Initialized empty MiniGit repo.")
 
@@ -50,68 +447,50 @@ def add(filename):
         print(f"File '{filename}' not found.")
         return
 
-    index = load_index()
-    if filename not in index["staged"]:
-        index["staged"].append(filename)
-    save_index(index)
-    print(f"Added '{filename}' to staging.")
+    with Repo() as repo:
+        if filename not in repo.index["staged"]:
+            repo.index["staged"].append(filename)
+        print(f"Added '{filename}' to staging.")
 
 
 def commit(message):
     ensure_repo()
-    index = load_index()
-    branch = index["current_branch"]
-    commits = index["branches"].get(branch, [])
-    last_commit = commits[-1] if commits else None
-    last_commit_files = set(last_commit["files"]) if last_commit else set()
-
-    # Auto-stage modified and new files
-    staged = index["staged"]
-    for file in os.listdir("."):
-        if file == MINIGIT_DIR or file.startswith("."):
-            continue
-        if os.path.isfile(file):
-            if file in last_commit_files:
-                # Check if modified
-                last_commit_path = os.path.join(COMMITS_DIR, last_commit["id"], file) if last_commit else None
-                if last_commit_path and os.path.exists(last_commit_path):
-                    with open(file, "rb") as f1, open(last_commit_path, "rb") as f2:
-                        if hashlib.sha1(f1.read()).hexdigest() != hashlib.sha1(f2.read()).hexdigest():
-                            if file not in staged:
-                                staged.append(file)
-                                print(f"Auto-staged modified file '{file}'")
-            else:
-                # New file not in last commit
-                if file not in staged:
-                    staged.append(file)
-                    print(f"Auto-staged new file '{file}'")
+    with Repo() as repo:
+        branch = repo.index["current_branch"]
+        commits = repo.index["branches"].get(branch, [])
+        last_commit = _load_commit(commits[-1]) if commits else None
+
+        # Auto-stage modified and new files
+        staged = repo.index["staged"]
+        hashcache = _load_hashcache()
+        modified_files, new_files, entries = _scan_worktree(repo.index, last_commit, hashcache)
+        for file in modified_files:
+            staged.append(file)
+            print(f"Auto-staged modified file '{file}'")
+        for file in new_files:
+            staged.append(file)
+            print(f"Auto-staged new file '{file}'")
     
-    if not staged:
-        print("No changes to commit")
-        return
+        if not staged:
+            _save_hashcache(hashcache)
+            print("No changes to commit")
+            return
     
-    index["staged"] = staged
-    save_index(index)
+        repo.index["staged"] = staged
 
-    commit_id = hashlib.sha1((message + str(datetime.now())).encode()).hexdigest()[:7]
-    commit_path = os.path.join(COMMITS_DIR, commit_id)
-    os.makedirs(commit_path)
+        def store(file):
+            entry = entries.get(file)
+            return _store_blob(file, hashcache, entry.stat() if entry else None)
 
-    for file in staged:
-        shutil.copy(file, os.path.join(commit_path, file))
+        files = dict(zip(staged, _run_parallel(store, staged)))
+        _save_hashcache(hashcache)
+        modes = {file: stat.S_IMODE(os.stat(file).st_mode) for file in staged}
 
-    commit_data = {
-        "id": commit_id,
-        "message": message,
-        "timestamp": datetime.now().isoformat(),
-        "files": staged.copy()
-    }
+        commit_id = _create_commit(message, files, modes)["id"]
+        repo.index["branches"][branch].append(commit_id)
+        repo.index["staged"] = []
 
-    index["branches"][branch].append(commit_data)
-    index["staged"] = []
-    save_index(index)
-
-    print(f"Committed to {branch} as {commit_id}: {message}")
+        print(f"Committed to {branch} as {commit_id}: {message}")
 
 
 def log():
@@ -119,7 +498,8 @@ def log():
     index = load_index()
     branch = index["current_branch"]
     commits = index["branches"].get(branch, [])
-    for commit in reversed(commits):
+    for commit_id in reversed(commits):
+        commit = _load_commit(commit_id)
         print(f"Commit {commit['id']}")
         print(f"Date: {commit['timestamp']}")
         print(f"\n    {commit['message']}\n")
@@ -127,46 +507,44 @@ def log():
 
 def branch(branch_name):
     ensure_repo()
-    index = load_index()
-    if branch_name in index["branches"]:
-        print("Branch already exists.")
-        return
+    with Repo() as repo:
+        if branch_name in repo.index["branches"]:
+            print("Branch already exists.")
+            return
 
-    current = index["current_branch"]
-    index["branches"][branch_name] = index["branches"][current].copy()
-    save_index(index)
-    print(f"Created branch '{branch_name}'.")
+        current = repo.index["current_branch"]
+        repo.index["branches"][branch_name] = repo.index["branches"][current].copy()
+        print(f"Created branch '{branch_name}'.")
 
 
 def checkout(branch_name):
     ensure_repo()
-    index = load_index()
-    if branch_name not in index["branches"]:
-        print("No such branch.")
-        return
+    with Repo() as repo:
+        if branch_name not in repo.index["branches"]:
+            print("No such branch.")
+            return
     
-    # Save current branch before switching
-    previous_branch = index["current_branch"]
+        # Save current branch before switching
+        previous_branch = repo.index["current_branch"]
     
-    # Update current branch in index
-    index["current_branch"] = branch_name
-    save_index(index)
+        # Update current branch in index
+        repo.index["current_branch"] = branch_name
     
-    # Get the latest commit from the target branch
-    branch_commits = index["branches"][branch_name]
-    if branch_commits:  # Only restore files if the branch has commits
-        latest_commit = branch_commits[-1]
-        commit_id = latest_commit["id"]
-        commit_path = os.path.join(COMMITS_DIR, commit_id)
+        # Get the latest commit from the target branch
+        branch_commits = repo.index["branches"][branch_name]
+        if branch_commits:  # Only restore files if the branch has commits
+            commit_id = branch_commits[-1]
+            latest_commit = _load_commit(commit_id)
         
-        # Restore files from the commit to the working directory
-        for file in latest_commit["files"]:
-            source_file = os.path.join(commit_path, file)
-            if os.path.exists(source_file):
-                shutil.copy(source_file, file)
+            # Restore files from the commit to the working directory
+            restores = [(_commit_file_path(latest_commit, file), file, _commit_file_mode(latest_commit, file))
+                        for file in latest_commit["files"]]
+            restores = [restore for restore in restores if os.path.exists(restore[0])]
+            _batch_copy_files(restores)
+            for _, file, _ in restores:
                 print(f"Restored '{file}' from commit {commit_id}")
     
-    print(f"Switched to branch '{branch_name}'.")
+        print(f"Switched to branch '{branch_name}'.")
 
 
 def create_pr(source, target):
@@ -176,8 +554,7 @@ def create_pr(source, target):
         print("One of the branches doesn't exist.")
         return
 
-    with open(PRS_FILE, "r") as f:
-        prs = json.load(f)
+    prs = _read_json(PRS_FILE)
 
     pr_id = len(prs) + 1
     prs.append({
@@ -187,16 +564,14 @@ def create_pr(source, target):
         "status": "open"
     })
 
-    with open(PRS_FILE, "w") as f:
-        json.dump(prs, f, indent=2)
+    _write_json(PRS_FILE, prs, indent=True)
 
     print(f"Pull request #{pr_id} created from {source} → {target}.")
 
 
 def pr_list():
     ensure_repo()
-    with open(PRS_FILE, "r") as f:
-        prs = json.load(f)
+    prs = _read_json(PRS_FILE)
 
     if not prs:
         print("No pull requests.")
@@ -208,28 +583,34 @@ def pr_list():
 
 def pr_merge(pr_id):
     ensure_repo()
-    pr_id = int(pr_id)
-    with open(PRS_FILE, "r") as f:
-        prs = json.load(f)
+    try:
+        pr_id = int(pr_id)
+    except ValueError:
+        print("Error: PR ID must be a number. Use 'python minigit.py pr-list' to see available PRs.")
+        return
+    prs = _read_json(PRS_FILE)
 
     for pr in prs:
         if pr["id"] == pr_id and pr["status"] == "open":
             source = pr["source"]
             target = pr["target"]
 
-            index = load_index()
-            src_commits = index["branches"][source]
-            tgt_commits = index["branches"][target]
+            with Repo() as repo:
+                src_commits = repo.index["branches"][source]
+                tgt_commits = repo.index["branches"][target]
 
-            # Find commits in source not in target
-            tgt_commit_ids = {c["id"] for c in tgt_commits}
-            new_commits = [c for c in src_commits if c["id"] not in tgt_commit_ids]
-            index["branches"][target].extend(new_commits)
-            save_index(index)
+                # Fast-forward when target's history is a prefix of source's:
+                # only the commits after it are new
+                if src_commits[:len(tgt_commits)] == tgt_commits:
+                    new_commits = src_commits[len(tgt_commits):]
+                else:
+                    # Find commits in source not in target
+                    tgt_commit_ids = set(tgt_commits)
+                    new_commits = [c for c in src_commits if c not in tgt_commit_ids]
+                tgt_commits.extend(new_commits)
 
             pr["status"] = "merged"
-            with open(PRS_FILE, "w") as f:
-                json.dump(prs, f, indent=2)
+            _write_json(PRS_FILE, prs, indent=True)
 
             print(f"PR #{pr_id} merged successfully.")
             return
@@ -256,24 +637,23 @@ def branch_list():
 
 def delete_branch(branch_name):
     ensure_repo()
-    index = load_index()
-    current = index["current_branch"]
+    with Repo() as repo:
+        current = repo.index["current_branch"]
     
-    if branch_name not in index["branches"]:
-        print(f"Branch '{branch_name}' not found.")
-        return
+        if branch_name not in repo.index["branches"]:
+            print(f"Branch '{branch_name}' not found.")
+            return
     
-    if branch_name == current:
-        print(f"Cannot delete the current branch '{branch_name}'.")
-        return
+        if branch_name == current:
+            print(f"Cannot delete the current branch '{branch_name}'.")
+            return
     
-    if branch_name == "main":
-        print("Cannot delete the 'main' branch.")
-        return
+        if branch_name == "main":
+            print("Cannot delete the 'main' branch.")
+            return
     
-    del index["branches"][branch_name]
-    save_index(index)
-    print(f"Deleted branch '{branch_name}'.")
+        del repo.index["branches"][branch_name]
+        print(f"Deleted branch '{branch_name}'.")
 
 
 def status():
@@ -284,7 +664,7 @@ def status():
     
     commits = index["branches"].get(branch, [])
     if commits:
-        last_commit = commits[-1]
+        last_commit = _load_commit(commits[-1])
         print(f"Last commit: {last_commit['id']} - {last_commit['message']}")
     else:
         print("No commits yet")
@@ -298,25 +678,9 @@ def status():
         print("\nNo staged files")
     
     # Check for modified or new files not yet staged
-    modified_files = []
-    new_files = []
-    last_commit_files = set(last_commit["files"]) if commits else set()
-    for file in os.listdir("."):
-        if file == MINIGIT_DIR or file.startswith("."):
-            continue
-        if os.path.isfile(file):
-            if file in last_commit_files:
-                # Check if modified
-                last_commit_path = os.path.join(COMMITS_DIR, last_commit["id"], file) if commits else None
-                if last_commit_path and os.path.exists(last_commit_path):
-                    with open(file, "rb") as f1, open(last_commit_path, "rb") as f2:
-                        if hashlib.sha1(f1.read()).hexdigest() != hashlib.sha1(f2.read()).hexdigest():
-                            if file not in staged:
-                                modified_files.append(file)
-            else:
-                # New file not in last commit
-                if file not in staged:
-                    new_files.append(file)
+    hashcache = _load_hashcache()
+    modified_files, new_files, _ = _scan_worktree(index, last_commit if commits else None, hashcache)
+    _save_hashcache(hashcache)
     
     if modified_files:
         print("\nModified files not staged:")
@@ -332,26 +696,17 @@ def status():
 
 def diff_commits(commit1_id, commit2_id):
     ensure_repo()
-    commit1_path = os.path.join(COMMITS_DIR, commit1_id)
-    commit2_path = os.path.join(COMMITS_DIR, commit2_id)
-    
-    if not os.path.exists(commit1_path):
+    index = load_index()
+    positions = _commit_positions(index)
+    if commit1_id not in positions:
         print(f"Commit {commit1_id} not found.")
         return
-    if not os.path.exists(commit2_path):
+    if commit2_id not in positions:
         print(f"Commit {commit2_id} not found.")
         return
     
-    index = load_index()
-    commit1_data = next((c for branch in index["branches"].values() for c in branch if c["id"] == commit1_id), None)
-    commit2_data = next((c for branch in index["branches"].values() for c in branch if c["id"] == commit2_id), None)
-    
-    if not commit1_data or not commit2_data:
-        print("Commit data not found in index.")
-        return
-    
     print(f"Diff between commit {commit1_id} and {commit2_id}")
-    _compare_files(commit1_data["files"], commit1_path, commit2_data["files"], commit2_path)
+    _compare_files(_load_commit(commit1_id), _load_commit(commit2_id))
 
 
 def diff_branches(branch1_name, branch2_name):
@@ -372,13 +727,11 @@ def diff_branches(branch1_name, branch2_name):
         print("One or both branches have no commits.")
         return
     
-    commit1_id = branch1_commits[-1]["id"]
-    commit2_id = branch2_commits[-1]["id"]
-    commit1_path = os.path.join(COMMITS_DIR, commit1_id)
-    commit2_path = os.path.join(COMMITS_DIR, commit2_id)
+    commit1_id = branch1_commits[-1]
+    commit2_id = branch2_commits[-1]
     
     print(f"Diff between branch '{branch1_name}' (commit {commit1_id}) and '{branch2_name}' (commit {commit2_id})")
-    _compare_files(branch1_commits[-1]["files"], commit1_path, branch2_commits[-1]["files"], commit2_path)
+    _compare_files(_load_commit(commit1_id), _load_commit(commit2_id))
 
 
 def diff_pr(pr_id):
@@ -389,8 +742,7 @@ def diff_pr(pr_id):
         print("Error: PR ID must be a number. Use 'python minigit.py pr-list' to see available PRs.")
         return
     
-    with open(PRS_FILE, "r") as f:
-        prs = json.load(f)
+    prs = _read_json(PRS_FILE)
     
     pr = next((p for p in prs if p["id"] == pr_id), None)
     if not pr:
@@ -412,210 +764,168 @@ def diff_pr(pr_id):
         print("One or both branches have no commits.")
         return
     
-    source_commit_id = source_commits[-1]["id"]
-    target_commit_id = target_commits[-1]["id"]
-    source_path = os.path.join(COMMITS_DIR, source_commit_id)
-    target_path = os.path.join(COMMITS_DIR, target_commit_id)
+    source_commit_id = source_commits[-1]
+    target_commit_id = target_commits[-1]
     
     print(f"Diff for PR #{pr_id}: {source} (commit {source_commit_id}) -> {target} (commit {target_commit_id})")
-    _compare_files(source_commits[-1]["files"], source_path, target_commits[-1]["files"], target_path)
+    _compare_files(_load_commit(source_commit_id), _load_commit(target_commit_id))
 
 
 def revert(commit_id):
     ensure_repo()
-    index = load_index()
-    branch = index["current_branch"]
-    commits = index["branches"].get(branch, [])
-    
-    commit_to_revert = next((c for c in commits if c["id"] == commit_id), None)
-    if not commit_to_revert:
-        print(f"Commit {commit_id} not found in current branch '{branch}'.")
-        return
+    with Repo() as repo:
+        branch = repo.index["current_branch"]
+        commits = repo.index["branches"].get(branch, [])
     
-    # Create a new commit that undoes the changes of the specified commit
-    # For simplicity, we'll restore the files to the state before this commit
-    commit_index = commits.index(commit_to_revert)
-    if commit_index == 0:
-        print("Cannot revert the first commit. Use reset if you want to remove all history.")
-        return
+        commit_index = repo.commit_positions.get(commit_id, {}).get(branch)
+        if commit_index is None:
+            print(f"Commit {commit_id} not found in current branch '{branch}'.")
+            return
     
-    previous_commit = commits[commit_index - 1]
-    previous_commit_path = os.path.join(COMMITS_DIR, previous_commit["id"])
-    new_commit_id = hashlib.sha1((f"Revert of {commit_id}" + str(datetime.now())).encode()).hexdigest()[:7]
-    new_commit_path = os.path.join(COMMITS_DIR, new_commit_id)
-    os.makedirs(new_commit_path)
+        # Create a new commit that undoes the changes of the specified commit
+        # For simplicity, we'll restore the files to the state before this commit
+        if commit_index == 0:
+            print("Cannot revert the first commit. Use reset if you want to remove all history.")
+            return
     
-    # Copy files from the previous commit to the new commit
-    for file in previous_commit["files"]:
-        source_file = os.path.join(previous_commit_path, file)
-        if os.path.exists(source_file):
-            shutil.copy(source_file, os.path.join(new_commit_path, file))
-            shutil.copy(source_file, file)  # Also update working directory
+        previous_commit = _load_commit(commits[commit_index - 1])
     
-    new_commit_data = {
-        "id": new_commit_id,
-        "message": f"Revert commit {commit_id}",
-        "timestamp": datetime.now().isoformat(),
-        "files": previous_commit["files"].copy()
-    }
+        # Reuse the previous commit's blobs for the new commit
+        files = {}
+        modes = {}
+        restores = []
+        for file in previous_commit["files"]:
+            source_file = _commit_file_path(previous_commit, file)
+            if os.path.exists(source_file):
+                if isinstance(previous_commit["files"], dict):
+                    files[file] = previous_commit["files"][file]
+                else:
+                    files[file] = _store_blob(source_file)
+                mode = _commit_file_mode(previous_commit, file)
+                if mode is not None:
+                    modes[file] = mode
+                restores.append((source_file, file, mode))
+        _batch_copy_files(restores)  # Also update working directory
     
-    index["branches"][branch].append(new_commit_data)
-    index["staged"] = []
-    save_index(index)
+        new_commit_id = _create_commit(f"Revert commit {commit_id}", files, modes)["id"]
+        repo.index["branches"][branch].append(new_commit_id)
+        repo.index["staged"] = []
     
-    print(f"Created revert commit {new_commit_id} to undo changes from {commit_id}")
+        print(f"Created revert commit {new_commit_id} to undo changes from {commit_id}")
 
 
 def reset(commit_id):
     ensure_repo()
-    index = load_index()
-    branch = index["current_branch"]
-    commits = index["branches"].get(branch, [])
+    with Repo() as repo:
+        branch = repo.index["current_branch"]
+        commits = repo.index["branches"].get(branch, [])
     
-    commit_to_reset_to = next((c for c in commits if c["id"] == commit_id), None)
-    if not commit_to_reset_to:
-        print(f"Commit {commit_id} not found in current branch '{branch}'.")
-        return
+        commit_index = repo.commit_positions.get(commit_id, {}).get(branch)
+        if commit_index is None:
+            print(f"Commit {commit_id} not found in current branch '{branch}'.")
+            return
     
-    commit_index = commits.index(commit_to_reset_to)
-    if commit_index == len(commits) - 1:
-        print("Already at this commit. No reset needed.")
-        return
+        if commit_index == len(commits) - 1:
+            print("Already at this commit. No reset needed.")
+            return
     
-    # Truncate history after the specified commit
-    index["branches"][branch] = commits[:commit_index + 1]
-    index["staged"] = []
-    save_index(index)
-    
-    # Restore files to the state of the reset commit
-    reset_commit_path = os.path.join(COMMITS_DIR, commit_id)
-    for file in commit_to_reset_to["files"]:
-        source_file = os.path.join(reset_commit_path, file)
-        if os.path.exists(source_file):
-            shutil.copy(source_file, file)
+        # Truncate history after the specified commit
+        repo.index["branches"][branch] = commits[:commit_index + 1]
+        repo.index["staged"] = []
+    
+        # Restore files to the state of the reset commit
+        commit_to_reset_to = _load_commit(commit_id)
+        restores = [(_commit_file_path(commit_to_reset_to, file), file, _commit_file_mode(commit_to_reset_to, file))
+                    for file in commit_to_reset_to["files"]]
+        restores = [restore for restore in restores if os.path.exists(restore[0])]
+        _batch_copy_files(restores)
+        for _, file, _ in restores:
             print(f"Restored '{file}' to state in commit {commit_id}")
     
-    print(f"Reset branch '{branch}' to commit {commit_id}. Subsequent history discarded.")
+        print(f"Reset branch '{branch}' to commit {commit_id}. Subsequent history discarded.")
 
 
-def _compare_files(files1, path1, files2, path2):
-    all_files = set(files1 + files2)
+def _compare_files(commit1, commit2):
+    import difflib
+    import filecmp
+    files1 = commit1["files"]
+    files2 = commit2["files"]
+    all_files = set(files1) | set(files2)
     for file in all_files:
-        file1_path = os.path.join(path1, file)
-        file2_path = os.path.join(path2, file)
-        
         if file not in files1:
+            file2_path = _commit_file_path(commit2, file)
             print(f"\nFile '{file}' was added in the second commit/branch.")
-            with open(file2_path, "r") as f:
-                content = f.readlines()
+            content = _read_committed_lines(file2_path)
             print("".join(["+ " + line for line in content[:5]]))
             if len(content) > 5:
                 print(f"... and {len(content) - 5} more lines")
         elif file not in files2:
+            file1_path = _commit_file_path(commit1, file)
             print(f"\nFile '{file}' was removed in the second commit/branch.")
-            with open(file1_path, "r") as f:
-                content = f.readlines()
+            content = _read_committed_lines(file1_path)
             print("".join(["- " + line for line in content[:5]]))
             if len(content) > 5:
                 print(f"... and {len(content) - 5} more lines")
         else:
-            with open(file1_path, "r") as f1, open(file2_path, "r") as f2:
-                content1 = f1.readlines()
-                content2 = f2.readlines()
+            file1_path = _commit_file_path(commit1, file)
+            file2_path = _commit_file_path(commit2, file)
+            # Skip identical files without splitting them into lines
+            if isinstance(files1, dict) and isinstance(files2, dict):
+                if files1[file] == files2[file]:
+                    continue
+            elif (_committed_size(file1_path) == _committed_size(file2_path)
+                    and filecmp.cmp(file1_path, file2_path, shallow=False)):
+                continue
+            content1 = _read_committed_lines(file1_path)
+            content2 = _read_committed_lines(file2_path)
             if content1 != content2:
                 print(f"\nChanges in '{file}':")
-                diff = difflib.unified_diff(content1, content2, fromfile=f"a/{file}", tofile=f"b/{file}", n=3)
-                for line in list(diff)[:10]:  # Limit to first 10 lines of diff for brevity
+                diff_lines = list(difflib.unified_diff(content1, content2, fromfile=f"a/{file}", tofile=f"b/{file}", n=3))
+                for line in diff_lines[:10]:  # Limit to first 10 lines of diff for brevity
                     print(line, end="")
-                if len(list(difflib.unified_diff(content1, content2))) > 10:
+                if len(diff_lines) > 10:
                     print("... (diff truncated)")
 
 
+# Command name -> (handler, argument usage); the usage lists the required arguments
+COMMANDS = {
+    "init": (init, ""),
+    "add": (add, "<filename>"),
+    "commit": (commit, "<message>"),
+    "log": (log, ""),
+    "branch": (branch, "<branch_name>"),
+    "checkout": (checkout, "<branch_name>"),
+    "create-pr": (create_pr, "<source_branch> <target_branch>"),
+    "pr-list": (pr_list, ""),
+    "pr-merge": (pr_merge, "<pr_id>"),
+    "status": (status, ""),
+    "list": (branch_list, ""),
+    "delete": (delete_branch, "<branch_name>"),
+    "diff": (diff_commits, "<commit1_id> <commit2_id>"),
+    "diff-branch": (diff_branches, "<branch1_name> <branch2_name>"),
+    "pr-diff": (diff_pr, "<pr_id>"),
+    "revert": (revert, "<commit_id>"),
+    "reset": (reset, "<commit_id>"),
+}
+
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python minigit.py <command> [args]")
         return
 
     cmd = sys.argv[1].lower()
+    if cmd not in COMMANDS:
+        print("Unknown command.")
+        return
 
-    match cmd:
-        case "init":
-            init()
-        case "add":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py add <filename>")
-                return
-            add(sys.argv[2])
-        case "commit":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py commit <message>")
-                return
-            commit(sys.argv[2])
-        case "log":
-            log()
-        case "branch":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py branch <branch_name>")
-                return
-            branch(sys.argv[2])
-        case "checkout":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py checkout <branch_name>")
-                return
-            checkout(sys.argv[2])
-        case "create-pr":
-            if len(sys.argv) < 4:
-                print("Usage: python minigit.py create-pr <source_branch> <target_branch>")
-                return
-            create_pr(sys.argv[2], sys.argv[3])
-        case "pr-list":
-            pr_list()
-        case "pr-merge":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py pr-merge <pr_id>")
-                return
-            try:
-                pr_id = int(sys.argv[2])
-                pr_merge(sys.argv[2])
-            except ValueError:
-                print("Error: PR ID must be a number. Use 'python minigit.py pr-list' to see available PRs.")
-                return
-        case "status":
-            status()
-        case "list":
-            branch_list()
-        case "delete":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py delete <branch_name>")
-                return
-            delete_branch(sys.argv[2])
-        case "diff":
-            if len(sys.argv) < 4:
-                print("Usage: python minigit.py diff <commit1_id> <commit2_id>")
-                return
-            diff_commits(sys.argv[2], sys.argv[3])
-        case "diff-branch":
-            if len(sys.argv) < 4:
-                print("Usage: python minigit.py diff-branch <branch1_name> <branch2_name>")
-                return
-            diff_branches(sys.argv[2], sys.argv[3])
-        case "pr-diff":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py pr-diff <pr_id>")
-                return
-            diff_pr(sys.argv[2])
-        case "revert":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py revert <commit_id>")
-                return
-            revert(sys.argv[2])
-        case "reset":
-            if len(sys.argv) < 3:
-                print("Usage: python minigit.py reset <commit_id>")
-                return
-            reset(sys.argv[2])
-        case _:
-            print("Unknown command.")
+    func, usage = COMMANDS[cmd]
+    argc = len(usage.split())
+    args = sys.argv[2:2 + argc]
+    if len(args) < argc:
+        print(f"Usage: python minigit.py {cmd} {usage}")
+        return
+    func(*args)
 
 
 if __name__ == "__main__":